@@ -1,53 +1,92 @@
+import hashlib
 import re
 from pathlib import Path
 import base64
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+_SLUG_RE = re.compile(r"[^a-zA-Z0-9_-]+")
 
 
 def _safe_slug(s: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9_-]+", "_", s).strip("_")[:60] or "output"
+    return _SLUG_RE.sub("_", s).strip("_")[:60] or "output"
 
 def _project_root() -> Path:
     # folder where main.py lives
     return Path(__file__).resolve().parent
 
+def _cover_prompt(title: str, blurb_or_summary: str) -> str:
+    return (
+        f"Book cover illustration for '{title}'. "
+        f"Focus on the mood and main themes: {blurb_or_summary[:800]}. "
+        "No text overlay, cinematic lighting, high contrast, modern style."
+    )
+
+def _media_path(out_dir: str | Path, filename: str) -> Path:
+    out_dir = _project_root() / out_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    return out_dir / filename
+
+def _media_key(*parts: str) -> str:
+    # Content hash baked into the filename: identical inputs reuse the file.
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+def _write_b64(b64: str, out_path: Path, chunk_chars: int = 1 << 16) -> None:
+    # Decode the base64 payload in 4-aligned slices so the full PNG never
+    # materializes in memory (gpt-image-1 only returns b64_json, no URL).
+    with open(out_path, "wb") as f:
+        for i in range(0, len(b64), chunk_chars):
+            f.write(base64.b64decode(b64[i:i + chunk_chars]))
+
 def generate_cover_image(client: OpenAI, title: str, blurb_or_summary: str,
                         out_dir: str | Path = "Images and TTS") -> str:
     """
     Use OpenAI Images API to create a cover-style image.
-    Saves to <project>/Images/cover_<slug>.png and returns that path.
+    Saves to <project>/Images/cover_<slug>_<key>.png and returns that path.
+    Skips the API call when the same (title, blurb, size) was generated before.
     """
-    prompt = (
-        f"Book cover illustration for '{title}'. "
-        f"Focus on the mood and main themes: {blurb_or_summary[:800]}. "
-        "No text overlay, cinematic lighting, high contrast, modern style."
-    )
+    key = _media_key(title, blurb_or_summary, "1024x1024")
+    out_path = _media_path(out_dir, f"cover_{_safe_slug(title)}_{key}.png")
+    if out_path.exists():
+        return str(out_path)
+
+    prompt = _cover_prompt(title, blurb_or_summary)
     resp = client.images.generate(
         model="gpt-image-1",
         prompt=prompt,
         size="1024x1024",
     )
-    b64 = resp.data[0].b64_json
-    img_bytes = base64.b64decode(b64)
+    _write_b64(resp.data[0].b64_json, out_path)
+    return str(out_path)
 
-    out_dir = _project_root() / out_dir
-    out_dir.mkdir(parents=True, exist_ok=True)
+async def generate_cover_image_async(aclient: AsyncOpenAI, title: str, blurb_or_summary: str,
+                                     out_dir: str | Path = "Images and TTS") -> str:
+    """Async variant of generate_cover_image, for overlapping with TTS."""
+    key = _media_key(title, blurb_or_summary, "1024x1024")
+    out_path = _media_path(out_dir, f"cover_{_safe_slug(title)}_{key}.png")
+    if out_path.exists():
+        return str(out_path)
 
-    out_path = out_dir / f"cover_{_safe_slug(title)}.png"
-    out_path.write_bytes(img_bytes)
+    resp = await aclient.images.generate(
+        model="gpt-image-1",
+        prompt=_cover_prompt(title, blurb_or_summary),
+        size="1024x1024",
+    )
+    _write_b64(resp.data[0].b64_json, out_path)
     return str(out_path)
 
 def speak_text(client: OpenAI, title: str, text: str, voice: str = "alloy",
                out_dir: str | Path = "Images and TTS") -> str:
     """
     Use Audio Speech API (gpt-4o-mini-tts) to synthesize MP3.
-    Saves to <project>/TTS/tts_<slug>.mp3 and returns that path.
+    Saves to <project>/TTS/tts_<slug>_<key>.mp3 and returns that path.
+    Skips the API call when the same (title, voice, text) was spoken before.
     """
-    out_dir = _project_root() / out_dir
-    out_dir.mkdir(parents=True, exist_ok=True)
+    key = _media_key(title, voice, text)
+    out_path = _media_path(out_dir, f"tts_{_safe_slug(title)}_{key}.mp3")
+    if out_path.exists():
+        return str(out_path)
 
-    out_path = out_dir / f"tts_{_safe_slug(title)}.mp3"
     with client.audio.speech.with_streaming_response.create(
         model="gpt-4o-mini-tts",
         voice=voice,
@@ -57,3 +96,20 @@ def speak_text(client: OpenAI, title: str, text: str, voice: str = "alloy",
 
     return str(out_path)
 
+async def speak_text_async(aclient: AsyncOpenAI, title: str, text: str, voice: str = "alloy",
+                           out_dir: str | Path = "Images and TTS") -> str:
+    """Async variant of speak_text, for overlapping with image generation."""
+    key = _media_key(title, voice, text)
+    out_path = _media_path(out_dir, f"tts_{_safe_slug(title)}_{key}.mp3")
+    if out_path.exists():
+        return str(out_path)
+
+    async with aclient.audio.speech.with_streaming_response.create(
+        model="gpt-4o-mini-tts",
+        voice=voice,
+        input=text,
+    ) as resp:
+        await resp.stream_to_file(out_path)
+
+    return str(out_path)
+
@@ -0,0 +1,62 @@
+import hashlib
+import json
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from LLM_Aditional import _project_root
+from tools import book_hash
+
+CACHE_DIR = _project_root() / ".cache" / "answers"
+SIM_THRESHOLD = 0.9  # G1: minimum cosine between new and cached query embedding
+
+
+def _key(titles: Iterable[str]) -> str:
+    return hashlib.sha1("\n".join(sorted(titles)).encode()).hexdigest()
+
+
+def get_answer(q_emb, titles: Iterable[str], books) -> Optional[dict]:
+    """Return a cached final_data dict if all validation gates pass.
+
+    G1: the query embedding is close to the cached one (cosine >= 0.9).
+    G2: the retrieved title set is identical to the cached one.
+    G3: every retrieved summary still hashes to its cached sha1.
+    """
+    titles = set(titles)
+    path = CACHE_DIR / f"{_key(titles)}.json"
+    if not path.exists():
+        return None
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    q = np.asarray(q_emb, dtype=np.float32)
+    cached = np.asarray(entry.get("q_emb", []), dtype=np.float32)
+    if cached.shape != q.shape:
+        return None
+    denom = np.linalg.norm(q) * np.linalg.norm(cached)
+    if not denom or float(q @ cached) / denom < SIM_THRESHOLD:
+        return None
+
+    if set(entry.get("titles", [])) != titles:
+        return None
+
+    hashes: Dict[str, str] = entry.get("summary_hashes", {})
+    for t in titles:
+        if hashes.get(t) != book_hash(books, t):
+            return None
+    return entry.get("final_data")
+
+
+def put_answer(q_emb, titles: Iterable[str], books, final_data: dict) -> None:
+    titles = sorted(set(titles))
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    entry = {
+        "q_emb": list(q_emb),
+        "titles": titles,
+        "summary_hashes": {t: book_hash(books, t) for t in titles},
+        "final_data": final_data,
+    }
+    path = CACHE_DIR / f"{_key(titles)}.json"
+    path.write_text(json.dumps(entry), encoding="utf-8")
@@ -1,45 +1,64 @@
 # main.py
 # pip install chromadb openai python-dotenv
 
-import os
+import asyncio
 import json
+import os
 from typing import Dict, Tuple, List, Optional
 
 import chromadb
-from chromadb.utils import embedding_functions
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
-from vectorDB import build_context_from_results, build_chroma_payload
+from vectorDB import build_context_from_results, build_chroma_payload, EMBED_MODEL, EMBED_DIM
 from tools import parse_json, make_get_summary_tool
-from LLM_Aditional import speak_text,generate_cover_image
+from query_cache import QueryCache
+from answer_cache import get_answer, put_answer
+from LLM_Aditional import speak_text_async, generate_cover_image_async, _project_root
 # ---------------------- Config ----------------------
 MODEL = "gpt-4.1-nano"          # Responses API model
 JSONL_PATH = "book_summaries.jsonl"
 COLLECTION_NAME = "book_summaries"
 TOP_K = 1
 
-BooksDict = Dict[str, Tuple[Optional[str], List[str]]]
+BooksDict = Dict[str, Tuple[Optional[str], List[str], str]]
 
-# ---------------------- LLM instructions & tool schema ----------------------
+# ---------------------- LLM instructions & schemas ----------------------
 RECOMMEND_INSTRUCTIONS = """You are a RAG book recommender.
 
 Rules (follow strictly):
 1) Use ONLY the provided CONTEXT. Do not invent books or use outside knowledge.
-2) Recommend exactly ONE title that appears in the CONTEXT.
-3) If no suitable title is present, return {"status":"no_match"} and nothing else.
-4) Output VALID JSON ONLY:
-   {
-     "status": "ok" | "no_match" | "refuse",
-     "title": "<exact title from CONTEXT>",
-     "blurb": "<4-5 engaging sentences tailored to the user>",
-     "reasons": ["<short reason 1>", "<short reason 2>"],
-     "verbal": "Because you want <summarized user preference>, I recommend <Title>. <1–2 sentence why this fits, based on CONTEXT>."
-   }
-5) If the user request is unsafe/clearly disallowed, return {"status":"refuse"}.
+2) Recommend exactly ONE title that appears in the CONTEXT; set status "ok".
+3) If no suitable title is present, set status "no_match".
+4) If the user request is unsafe/clearly disallowed, set status "refuse".
+5) "blurb": 4-5 engaging sentences tailored to the user. "verbal": "Because you want <summarized user preference>, I recommend <Title>." plus 1-2 sentences on why it fits, based on CONTEXT.
 6) Respond in the SAME LANGUAGE as the user query.
 """
 
+# Strict Structured Outputs for the Responses API: the server constrains
+# generation to this schema (strict mode requires every property listed in
+# required). A truncated/over-length response can still cut the JSON short,
+# so the parse sites keep a fallback.
+REC_FORMAT = {
+    "format": {
+        "type": "json_schema",
+        "name": "recommendation",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "status": {"type": "string", "enum": ["ok", "no_match", "refuse"]},
+                "title": {"type": "string"},
+                "blurb": {"type": "string"},
+                "reasons": {"type": "array", "items": {"type": "string"}},
+                "verbal": {"type": "string"},
+            },
+            "required": ["status", "title", "blurb", "reasons", "verbal"],
+            "additionalProperties": False,
+        },
+    }
+}
+
 # Flat tool schema for Responses API
 SUMMARY_TOOL = {
     "type": "function",
@@ -55,10 +74,98 @@ SUMMARY_TOOL = {
 }
 
 # ---------------------- Helpers: printing & media ----------------------
-def print_result(data: dict, books: BooksDict):
+class _VerbalPrinter:
+    """Print the "verbal" field live while the JSON answer streams in.
+
+    Streaming only starts once "status" has arrived with value "ok"
+    ("status" precedes "verbal" in the schema), so no_match/refuse
+    answers keep their canonical print_result line instead of first
+    echoing a contradictory verbal.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = None      # next unprinted index inside the value
+        self.done = False
+
+    @staticmethod
+    def _string_field(buf: str, key: str) -> str | None:
+        """Return the completed string value for `key`, or None if not yet streamed."""
+        k = buf.find(f'"{key}"')
+        if k < 0:
+            return None
+        colon = buf.find(":", k + len(key) + 2)
+        start = buf.find('"', colon + 1) if colon >= 0 else -1
+        if start < 0:
+            return None
+        i = start + 1
+        while i < len(buf):
+            if buf[i] == "\\":
+                i += 2
+                continue
+            if buf[i] == '"':
+                return buf[start + 1:i]
+            i += 1
+        return None
+
+    def feed(self, delta: str) -> None:
+        if self.done:
+            return
+        self.buf += delta
+        if self.pos is None:
+            status = self._string_field(self.buf, "status")
+            if status is None:
+                return
+            if status != "ok":
+                self.done = True  # leave non-ok statuses to print_result
+                return
+            key = self.buf.find('"verbal"')
+            if key < 0:
+                return
+            colon = self.buf.find(":", key + len('"verbal"'))
+            quote = self.buf.find('"', colon + 1) if colon >= 0 else -1
+            if quote < 0:
+                return
+            self.pos = quote + 1
+            print("\nBot> ", end="", flush=True)
+        while self.pos < len(self.buf):
+            ch = self.buf[self.pos]
+            if ch == "\\":
+                if self.pos + 1 >= len(self.buf):
+                    break  # wait for the escaped character
+                nxt = self.buf[self.pos + 1]
+                if nxt == "u":
+                    if self.pos + 6 > len(self.buf):
+                        break  # wait for the 4 hex digits
+                    cp = int(self.buf[self.pos + 2:self.pos + 6], 16)
+                    if 0xD800 <= cp <= 0xDBFF:
+                        # High surrogate: need the paired \uXXXX as well.
+                        if self.pos + 12 > len(self.buf):
+                            break
+                        low = int(self.buf[self.pos + 8:self.pos + 12], 16)
+                        cp = 0x10000 + ((cp - 0xD800) << 10) + (low - 0xDC00)
+                        self.pos += 12
+                    else:
+                        self.pos += 6
+                    print(chr(cp), end="", flush=True)
+                    continue
+                print({"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}.get(nxt, nxt),
+                      end="", flush=True)
+                self.pos += 2
+                continue
+            if ch == '"':
+                self.done = True
+                print(flush=True)
+                return
+            print(ch, end="", flush=True)
+            self.pos += 1
+
+
+def print_result(data: dict, books: BooksDict, verbal_already_printed: bool = False):
     status = data.get("status")
     if status == "ok":
-        print("\nBot>", data.get("verbal") or data.get("blurb", ""))
+        if not verbal_already_printed:
+            print("\nBot>", data.get("verbal") or data.get("blurb", ""))
         title = data.get("title")
         if title and title in books:
             summary = books[title][0] or ""
@@ -72,43 +179,88 @@ def print_result(data: dict, books: BooksDict):
         print("\nBot>", data.get("verbal", ""))
 
 
+async def _media_phase(title: str, blurb_or_summary: str, verbal_text: str):
+    """Ask for image/TTS and run the requested OpenAI calls concurrently.
+
+    With SPECULATIVE_MEDIA=1 set, both requests start before the prompts are
+    answered so generation latency hides behind the user's typing time; a
+    task whose prompt is answered N is cancelled.
+    """
+    aclient = AsyncOpenAI()
+    loop = asyncio.get_running_loop()
+    # SPECULATIVE_MEDIA=1 trades possibly wasted tokens for hidden latency.
+    speculative = os.getenv("SPECULATIVE_MEDIA", "").lower() in ("1", "true", "yes")
+
+    img_task = tts_task = None
+    if speculative:
+        img_task = asyncio.create_task(generate_cover_image_async(aclient, title, blurb_or_summary))
+        tts_task = asyncio.create_task(speak_text_async(aclient, title, verbal_text, voice="alloy"))
+
+    yn_img = (await loop.run_in_executor(
+        None, input, "\nGenerate a cover-style image for this recommendation? (Y/N): ")).strip().lower()
+    yn_tts = (await loop.run_in_executor(
+        None, input, "Speak the recommendation as audio (TTS)? (Y/N): ")).strip().lower()
+    want_img = yn_img.startswith("y")
+    want_tts = yn_tts.startswith("y")
+
+    if not speculative:
+        if want_img:
+            img_task = asyncio.create_task(generate_cover_image_async(aclient, title, blurb_or_summary))
+        if want_tts:
+            tts_task = asyncio.create_task(speak_text_async(aclient, title, verbal_text, voice="alloy"))
+
+    for name, wanted, task in (("image", want_img, img_task), ("audio", want_tts, tts_task)):
+        if task is None:
+            continue
+        if not wanted:
+            task.cancel()
+            continue
+        try:
+            print(f"[{name} saved] {await task}")
+        except Exception as e:
+            print(f"[{name} error] {e}")
+
+
 # ---------------------- Main ----------------------
 def main():
     # 0) Load env + clients
-    load_dotenv()  # expects .env with OPENAI_API_KEY; optional CHROMA_OPENAI_API_KEY
-    if not os.getenv("CHROMA_OPENAI_API_KEY") and os.getenv("OPENAI_API_KEY"):
-        os.environ["CHROMA_OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+    load_dotenv()  # expects .env with OPENAI_API_KEY
     client = OpenAI()  # uses OPENAI_API_KEY
 
     # 1) Parse JSONL once (kept in memory)
     books = parse_json(JSONL_PATH)
     print(f"[load] Books: {len(books)}")
 
-    # 2) Chroma: collection + ingest
-    ef = embedding_functions.OpenAIEmbeddingFunction(
-        api_key=os.getenv("CHROMA_OPENAI_API_KEY"),
-        model_name="text-embedding-3-small",
-    )
-    chroma_client = chromadb.Client()
+    # 2) Chroma: persistent collection + delta ingest (embed only new docs)
+    chroma_client = chromadb.PersistentClient(path=str(_project_root() / ".chroma"))
+    # Dim suffix keeps a stale persisted index from another EMBED_DIM apart.
     collection = chroma_client.get_or_create_collection(
-        name=COLLECTION_NAME,
-        embedding_function=ef,
+        name=f"{COLLECTION_NAME}_{EMBED_DIM}d",
+        metadata={"hnsw:space": "cosine"},
     )
 
-    ids, docs, metas = build_chroma_payload(books)
-    try:
-        collection.add(ids=ids, documents=docs, metadatas=metas)
-    except Exception:
-        pass  # likely duplicates on rerun; ok for quick iteration
+    if collection.count() < len(books):
+        existing = set(collection.get(include=[])["ids"])
+        new_books = {t: v for t, v in books.items() if t not in existing}
+        if new_books:
+            ids, docs, metas, embs = build_chroma_payload(new_books, openai_client=client)
+            collection.add(ids=ids, documents=docs, metadatas=metas, embeddings=embs)
 
     # 3) Semantic search
+    query_cache = QueryCache(path=_project_root() / ".cache" / "queries")
     user_q = input("\nTell me what you're interested in so I can recommend a book:\n")
-    results = collection.query(
-        query_texts=[user_q],
-        n_results=TOP_K,
-        include=["documents", "metadatas", "distances"],
-    )
-    context = build_context_from_results(dict(results), k=TOP_K)
+    q_emb = client.embeddings.create(model=EMBED_MODEL, input=[user_q],
+                                     dimensions=EMBED_DIM).data[0].embedding
+    results = query_cache.get(q_emb)
+    if results is None:
+        results = collection.query(
+            query_embeddings=[q_emb],
+            n_results=TOP_K,
+            include=["documents", "metadatas"],
+        )
+        query_cache.put(q_emb, results)
+        query_cache.save()
+    context = build_context_from_results(results, k=TOP_K)
     print("\nContext:\n---\n" + context + "\n---")
 
     # Keep the single valid title from metas (for safety)
@@ -119,45 +271,67 @@ def main():
     # 4) Prepare tool (real Python function the model will call)
     tool_func = make_get_summary_tool(books)
 
-    # 5) Responses API — first call (force 1 tool call)
-    input_items = [
-        {"role": "system", "content": RECOMMEND_INSTRUCTIONS},
-        {"role": "user",
-         "content": f"USER_QUERY:\n{user_q}\n\nCONTEXT (use only this):\n---\n{context}\n---"},
-    ]
-    first = client.responses.create(
-        model=MODEL,
-        input=input_items,  # <-- pass the list, not str(...)
-        tools=[SUMMARY_TOOL],
-        tool_choice={"type": "function", "name": "get_summary_by_title"},
-        temperature=0.2,
-    )
-
-    # If the model already returned final JSON (no tool call), use it
-    final_data = None
-    if first.output_text:
-        try:
-            parsed = json.loads(first.output_text)
-            if isinstance(parsed, dict) and parsed.get("status"):
-                final_data = parsed
-        except json.JSONDecodeError:
-            pass
-
-    # Otherwise, extract the tool call from response.output
+    # 5) Answer cache: a validated hit skips both Responses calls entirely
+    final_data = get_answer(q_emb, valid_titles, books)
+    first = None
+    verbal_streamed = False
+    if final_data is None:
+        input_items = [
+            {"role": "system", "content": RECOMMEND_INSTRUCTIONS},
+            {"role": "user",
+             "content": f"USER_QUERY:\n{user_q}\n\nCONTEXT (use only this):\n---\n{context}\n---"},
+        ]
+
+        if only_title:
+            # Single retrieved title: CONTEXT already carries its canonical
+            # summary, so skip the tool roundtrip and answer in one call.
+            verbal_live = _VerbalPrinter()
+            with client.responses.stream(
+                model=MODEL,
+                input=input_items,
+                text=REC_FORMAT,
+                temperature=0.2,
+            ) as stream:
+                for event in stream:
+                    if event.type == "response.output_text.delta":
+                        verbal_live.feed(event.delta)
+                first = stream.get_final_response()
+            verbal_streamed = verbal_live.done
+            try:
+                final_data = json.loads(first.output_text or "{}")
+            except json.JSONDecodeError:
+                print("\nRaw response:\n", first.output_text or "")
+                return
+        else:
+            first = client.responses.create(
+                model=MODEL,
+                input=input_items,  # <-- pass the list, not str(...)
+                tools=[SUMMARY_TOOL],
+                tool_choice={"type": "function", "name": "get_summary_by_title"},
+                text=REC_FORMAT,
+                temperature=0.2,
+            )
+
+            # If the model already returned final JSON (no tool call), use it
+            if first.output_text:
+                try:
+                    parsed = json.loads(first.output_text)
+                    if isinstance(parsed, dict) and parsed.get("status"):
+                        final_data = parsed
+                except json.JSONDecodeError:
+                    pass
+
+    # Otherwise, extract the tool call from response.output (no model_dump:
+    # that deep-copies the whole response; the attribute objects suffice)
     call = None
     if final_data is None:
-        dump = first.model_dump()
-        for item in dump.get("output", []):
-            if item.get("type") == "function_call":
-                call = item
-                break
-            if item.get("type") == "message":
-                for part in item.get("content", []):
-                    if part.get("type") == "function_call":
-                        call = part
-                        break
-                if call:
-                    break
+        call = next((it for it in first.output
+                     if getattr(it, "type", None) == "function_call"), None)
+        if call is None:
+            parts = [p for it in first.output if getattr(it, "type", None) == "message"
+                     for p in getattr(it, "content", [])]
+            call = next((p for p in parts
+                         if getattr(p, "type", None) == "function_call"), None)
 
     if final_data is None and call is None:
         print("\nRaw response:\n", first.output_text or "(no text and no tool call)")
@@ -165,9 +339,9 @@ def main():
 
     # 6) If there was a tool call: run the local function and send the output back
     if final_data is None:
-        call_id = call.get("call_id") or call.get("id")
-        fn_name = call.get("name")
-        args_json = call.get("arguments") or "{}"
+        call_id = getattr(call, "call_id", None) or getattr(call, "id", None)
+        fn_name = getattr(call, "name", None)
+        args_json = getattr(call, "arguments", None) or "{}"
         try:
             args = json.loads(args_json)
         except json.JSONDecodeError:
@@ -182,8 +356,9 @@ def main():
         if fn_name == SUMMARY_TOOL["name"]:
             tool_result = tool_func(title_arg) or ""
 
-        # Second call: send the function_call_output (Responses API)
-        final = client.responses.create(
+        # Second call: stream the answer so "verbal" prints as tokens arrive
+        verbal_live = _VerbalPrinter()
+        with client.responses.stream(
             model=MODEL,
             previous_response_id=first.id,
             input=[{
@@ -191,8 +366,14 @@ def main():
                 "call_id": call_id,
                 "output": tool_result,
             }],
+            text=REC_FORMAT,
             temperature=0.2,
-        )
+        ) as stream:
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    verbal_live.feed(event.delta)
+            final = stream.get_final_response()
+        verbal_streamed = verbal_live.done
 
         try:
             final_data = json.loads(final.output_text or "{}")
@@ -200,8 +381,10 @@ def main():
             print("\nRaw response:\n", final.output_text or "")
             return
 
-    # 7) Print final structured result
-    print_result(final_data, books)
+    # 7) Store fresh answers, then print the structured result
+    if first is not None and final_data:
+        put_answer(q_emb, valid_titles, books, final_data)
+    print_result(final_data, books, verbal_already_printed=verbal_streamed)
 
     # 8) Optional: Y/N image generation & TTS (only when we have a title)
     if final_data and final_data.get("status") == "ok" and final_data.get("title"):
@@ -209,23 +392,7 @@ def main():
         blurb_or_summary = final_data.get("blurb") or (books.get(title, ("", []))[0] or "")
         verbal_text = final_data.get("verbal") or final_data.get("blurb") or f"Recommendation: {title}"
 
-        # Ask for image
-        yn_img = input("\nGenerate a cover-style image for this recommendation? (Y/N): ").strip().lower()
-        if yn_img.startswith("y"):
-            try:
-                img_path = generate_cover_image(client, title, blurb_or_summary)
-                print(f"[image saved] {img_path}")
-            except Exception as e:
-                print(f"[image error] {e}")
-
-        # Ask for TTS
-        yn_tts = input("Speak the recommendation as audio (TTS)? (Y/N): ").strip().lower()
-        if yn_tts.startswith("y"):
-            try:
-                audio_path = speak_text(client, title, verbal_text, voice="alloy")
-                print(f"[audio saved] {audio_path}")
-            except Exception as e:
-                print(f"[tts error] {e}")
+        asyncio.run(_media_phase(title, blurb_or_summary, verbal_text))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+class QueryCache:
+    """Approximate query cache (Proximity-style).
+
+    Keys are L2-normalized query embeddings held in one contiguous
+    (capacity, dim) float32 matrix, so a probe is a single BLAS
+    matrix-vector product plus an argmax. A lookup is a hit when the
+    cosine similarity to the nearest cached key is >= 1 - tau, so repeat
+    or paraphrased queries skip the embed+ANN roundtrip. Rows are reused
+    in least-recently-used order once `capacity` is exceeded.
+
+    When `path` is given, the key matrix (keys.npy) and results
+    (values.json) are loaded from there at startup and written back by
+    save(), so the cache survives the one-query-per-process CLI flow.
+    Persisted entries are reloaded in insertion order; the fine-grained
+    LRU order is not kept across runs.
+    """
+
+    def __init__(self, tau: float = 0.05, capacity: int = 64,
+                 path: str | Path | None = None):
+        self.tau = tau
+        self.capacity = capacity
+        self.path = Path(path) if path else None
+        self.keys: np.ndarray | None = None  # allocated on first put/load
+        self.values: list[dict | None] = []
+        self.size = 0
+        self._lru: list[int] = []  # row indices, oldest first
+        if self.path is not None:
+            self._load()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        v = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _load(self) -> None:
+        keys_file = self.path / "keys.npy"
+        values_file = self.path / "values.json"
+        if not (keys_file.exists() and values_file.exists()):
+            return
+        try:
+            keys = np.load(keys_file)
+            values = json.loads(values_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError, json.JSONDecodeError):
+            return
+        if keys.ndim != 2 or not isinstance(values, list) or len(values) != keys.shape[0]:
+            return
+        n = min(keys.shape[0], self.capacity)
+        self.keys = np.empty((self.capacity, keys.shape[1]), dtype=np.float32)
+        self.keys[:n] = keys[:n]
+        self.values = list(values[:n])
+        self.size = n
+        self._lru = list(range(n))
+
+    def save(self) -> None:
+        if self.path is None or not self.size:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        np.save(self.path / "keys.npy", self.keys[:self.size])
+        (self.path / "values.json").write_text(
+            json.dumps(self.values[:self.size]), encoding="utf-8")
+
+    def get(self, embedding) -> dict | None:
+        """Return the cached result for the closest key, or None on miss."""
+        if not self.size:
+            return None
+        q = self._normalize(embedding)
+        if self.keys.shape[1] != q.shape[0]:
+            return None  # stale cache from another embedding dimension
+        sims = self.keys[:self.size] @ q
+        row = int(np.argmax(sims))
+        if sims[row] < 1.0 - self.tau:
+            return None
+        self._lru.remove(row)
+        self._lru.append(row)
+        return self.values[row]
+
+    def put(self, embedding, value: dict) -> None:
+        q = self._normalize(embedding)
+        if self.keys is not None and self.keys.shape[1] != q.shape[0]:
+            # Embedding dimension changed: drop the stale entries.
+            self.keys = None
+            self.values = []
+            self.size = 0
+            self._lru = []
+        if self.keys is None:
+            self.keys = np.empty((self.capacity, q.shape[0]), dtype=np.float32)
+        if self.size < self.capacity:
+            row = self.size
+            self.size += 1
+            self.values.append(None)
+        else:
+            row = self._lru.pop(0)
+        self.keys[row] = q
+        self.values[row] = value
+        self._lru.append(row)
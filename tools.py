@@ -1,6 +1,8 @@
-import json
+import hashlib
 from typing import Dict, Tuple, Optional, List
 
+import orjson
+
 MODEL = "gpt-4.1-nano"          # Responses API model
 JSONL_PATH = "book_summaries.jsonl"
 COLLECTION_NAME = "book_summaries"
@@ -8,29 +10,42 @@ TOP_K = 1
 
 
 # ---------------------- Data helpers ----------------------
-BooksDict = Dict[str, Tuple[Optional[str], List[str]]]
+BooksDict = Dict[str, Tuple[Optional[str], List[str], str]]
+
+_EMPTY_HASH = hashlib.sha1(b"").hexdigest()
 
 def parse_json(path: str = JSONL_PATH) -> BooksDict:
-    """Parse JSONL once at startup. Returns {title: (summary_short, [themes])}."""
+    """Parse JSONL once at startup.
+
+    Returns {title: (summary_short, [themes], sha1)} — the summary hash is
+    computed here once so cache validators never re-hash on the hot path.
+    """
     books: BooksDict = {}
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                row = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            title = row.get("title")
-            if not title:
-                continue
-            summary = row.get("summary_short")
-            themes = row.get("themes") or []
-            if not isinstance(themes, list):
-                themes = [str(themes)]
-            books[title] = (summary, themes)
+    with open(path, "rb") as f:
+        data = f.read()
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            continue
+        title = row.get("title")
+        if not title:
+            continue
+        summary = row.get("summary_short")
+        themes = row.get("themes") or []
+        if not isinstance(themes, list):
+            themes = [str(themes)]
+        h = hashlib.sha1((summary or "").encode()).hexdigest()
+        books[title] = (summary, themes, h)
     return books
 
+def book_hash(books: BooksDict, title: str) -> str:
+    """Precomputed sha1 of the title's summary (empty-string hash if unknown)."""
+    entry = books.get(title)
+    return entry[2] if entry else _EMPTY_HASH
+
 def make_get_summary_tool(books: BooksDict):
     """Closure over the in-memory dict: title -> summary_short."""
     def get_summary_by_title(title: str) -> str: